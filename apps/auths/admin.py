@@ -12,8 +12,8 @@ class ClientAdmin(admin.ModelAdmin):
     model = Client
     list_display = (
         "phone_number", "is_superuser", "invite_code", 
-        "invited_by", "is_staff", "is_active"
+        "invited_by", "is_staff", "is_active", "created_at"
     )
-    list_filter = ("phone_number", "invite_code", "invited_by")
+    list_filter = ("phone_number", "invite_code", "invited_by", "is_active")
     search_fields = ("phone_number", "invite_code", "invited_by")
 
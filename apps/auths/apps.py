@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AuthsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auths'
+
+    def ready(self):
+        if settings.WARMUP_ON_READY:
+            from . import warmup
+            warmup.preload()
@@ -0,0 +1,149 @@
+# Django
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count
+
+# Third-Party
+from django_redis import get_redis_connection
+
+# Python
+import logging
+
+# Local
+from .models import Client
+
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "leaderboard:inviters"
+REBUILD_KEY = f"{LEADERBOARD_KEY}:rebuild"
+# Set while a rebuild runs, invites are then also counted in REBUILD_KEY
+REBUILD_MARKER_KEY = f"{LEADERBOARD_KEY}:rebuilding"
+# Expiry of the marker if a rebuild dies halfway, in seconds
+REBUILD_TIMEOUT = 3600
+
+RECORD_INVITE_SCRIPT = """
+redis.call("ZINCRBY", KEYS[1], 1, ARGV[1])
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    redis.call("ZINCRBY", KEYS[3], 1, ARGV[1])
+end
+"""
+
+FINISH_REBUILD_SCRIPT = """
+redis.call("DEL", KEYS[2])
+if redis.call("EXISTS", KEYS[3]) == 1 then
+    redis.call("RENAME", KEYS[3], KEYS[1])
+else
+    redis.call("DEL", KEYS[1])
+end
+"""
+
+
+def record_invite(inviter_id: int):
+    """
+    Count one more follower for the inviter.
+
+    During a rebuild the invite is replayed into the new leaderboard too.
+
+    :param inviter_id: The id of the inviter.
+    :type inviter_id: int
+    """
+    redis = get_redis_connection("default")
+    redis.register_script(RECORD_INVITE_SCRIPT)(
+        keys=[LEADERBOARD_KEY, REBUILD_MARKER_KEY, REBUILD_KEY],
+        args=[inviter_id],
+    )
+
+
+def top(limit: int = 10) -> list:
+    """
+    Get the inviters with the most followers.
+
+    :param limit: The number of inviters to return.
+    :type limit: int
+    :return: Pairs of (client id, followers), best first.
+    :rtype: list
+    """
+    entries = get_redis_connection("default").zrevrange(
+        LEADERBOARD_KEY, 0, limit - 1, withscores=True
+    )
+    return [(int(member), int(score)) for member, score in entries]
+
+
+def rank(client_id: int) -> tuple:
+    """
+    Get the position of a client in the leaderboard.
+
+    :param client_id: The id of the client.
+    :type client_id: int
+    :return: Pair of (rank starting from 1 or None, followers).
+    :rtype: tuple
+    """
+    pipeline = get_redis_connection("default").pipeline()
+    pipeline.zrevrank(LEADERBOARD_KEY, client_id)
+    pipeline.zscore(LEADERBOARD_KEY, client_id)
+    position, score = pipeline.execute()
+    if position is None:
+        return None, 0
+    return position + 1, int(score)
+
+
+def mask_phone_number(phone_number) -> str:
+    """
+    Hide the middle digits of a phone number shown to other clients.
+
+    :param phone_number: The phone number.
+    :return: The number with only the country code and the last two
+        digits visible, e.g. "+7********66".
+    :rtype: str
+    """
+    number = str(phone_number)
+    return f"{number[:2]}{'*' * (len(number) - 4)}{number[-2:]}"
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """
+    Repopulate the leaderboard from the database.
+
+    Follower counts are read from the primary, replicas may miss the
+    latest invites, with a server-side cursor and added to a temporary
+    key in batches. Invites recorded meanwhile are added there as well
+    and the key replaces the live one in a single script. An invite
+    committed between setting the marker and the start of the query is
+    counted twice until the next rebuild.
+
+    :param batch_size: Rows per database fetch and Redis pipeline.
+    :type batch_size: int
+    :return: The number of inviters read from the database.
+    :rtype: int
+    """
+    redis = get_redis_connection("default")
+    pipeline = redis.pipeline()
+    pipeline.delete(REBUILD_KEY)
+    pipeline.set(REBUILD_MARKER_KEY, 1, ex=REBUILD_TIMEOUT)
+    pipeline.execute()
+
+    counts = (
+        Client.objects.using(DEFAULT_DB_ALIAS)
+        .filter(invited_by__isnull=False)
+        .values("invited_by_id")
+        .annotate(followers=Count("id"))
+        .order_by("invited_by_id")
+        .iterator(chunk_size=batch_size)
+    )
+    total = 0
+    pipeline = redis.pipeline(transaction=False)
+    for row in counts:
+        # Increment, the key may already hold replayed invites
+        pipeline.zincrby(
+            REBUILD_KEY, row["followers"], row["invited_by_id"]
+        )
+        total += 1
+        if len(pipeline) >= batch_size:
+            pipeline.execute()
+    pipeline.execute()
+
+    redis.register_script(FINISH_REBUILD_SCRIPT)(
+        keys=[LEADERBOARD_KEY, REBUILD_MARKER_KEY, REBUILD_KEY]
+    )
+    logger.info("Leaderboard rebuilt with %s inviters", total)
+    return total
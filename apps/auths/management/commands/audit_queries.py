@@ -0,0 +1,305 @@
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    DEFAULT_DB_ALIAS, IntegrityError, connections, transaction,
+)
+from django.db.migrations.writer import MigrationWriter
+from django.db.models import BooleanField, Index, Q
+from django.utils import timezone
+
+# Python
+from datetime import timedelta
+import json
+import re
+
+# Local
+from auths.models import Client
+
+
+class Rollback(Exception):
+    """Raised to undo the seeded dataset."""
+
+
+def walk(node: dict):
+    """Yield a plan node and all of its children."""
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+class Command(BaseCommand):
+    """EXPLAIN the app's hot queries and flag the ones without an index."""
+
+    help = (
+        "Seed a dataset, run the hot Client queries under "
+        "EXPLAIN (ANALYZE, BUFFERS) and propose missing indexes. "
+        "Everything is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=10000,
+            help="Clients to seed, 0 to use the existing data "
+                 "(default %(default)s).",
+        )
+        parser.add_argument(
+            "--cost-threshold", type=float, default=1000.0,
+            help="Flag plans with a higher total cost "
+                 "(default %(default)s).",
+        )
+        parser.add_argument(
+            "--database", default=DEFAULT_DB_ALIAS,
+            help="Database alias to audit (default %(default)s).",
+        )
+        parser.add_argument(
+            "--fail-on-findings", action="store_true",
+            help="Exit with an error if any query is flagged.",
+        )
+
+    def queries(self, sample: dict) -> list:
+        """
+        The representative queries of the app.
+
+        :param sample: Values to look up, taken from the dataset.
+        :type sample: dict
+        :return: Triples of (name, queryset, index that would serve it).
+        :rtype: list
+        """
+        return [
+            (
+                "client by phone_number (CustomAuth.post)",
+                Client.objects.filter(phone_number=sample["phone_number"]),
+                Index(fields=("phone_number",), name="client_phone_idx"),
+            ),
+            (
+                "client by invite_code (PersonalArea.patch)",
+                Client.objects.filter(invite_code=sample["invite_code"]),
+                Index(fields=("invite_code",), name="client_invite_code_idx"),
+            ),
+            (
+                "followers by invite code (ClientSerializer.get_followers)",
+                Client.objects.filter(
+                    invited_by__invite_code=sample["invite_code"]
+                ),
+                Index(fields=("invited_by",), name="client_invited_by_idx"),
+            ),
+            (
+                "invite code exists (generate_invite_code)",
+                Client.objects.filter(
+                    invite_code=sample["new_code"]
+                ).values("pk")[:1],
+                Index(fields=("invite_code",), name="client_invite_code_idx"),
+            ),
+            (
+                "stale unverified clients (purge_unverified)",
+                Client.objects.stale_unverified(
+                    older_than=settings.UNVERIFIED_CLIENT_TTL_HOURS
+                ).filter(id__gt=0).order_by("id")
+                .values_list("id", flat=True)[:1000],
+                Index(
+                    fields=("id",), condition=Q(is_active=False),
+                    name="client_inactive_id_idx",
+                ),
+            ),
+        ]
+
+    def derive_index(self, node: dict):
+        """
+        Build an index from the Filter of a Seq Scan on the Client table.
+
+        Boolean columns become the condition of a partial index, the
+        others its fields.
+
+        :param node: The Seq Scan plan node.
+        :type node: dict
+        :return: The index or None if no Client column is filtered on.
+        :rtype: Index
+        """
+        condition = node.get("Filter", "")
+        fields = []
+        flags = {}
+        for field in Client._meta.concrete_fields:
+            column = re.escape(field.column)
+            if not re.search(rf"\b{column}\b", condition):
+                continue
+            if isinstance(field, BooleanField):
+                negated = re.search(rf"NOT {column}\b", condition)
+                flags[field.name] = not negated
+            else:
+                fields.append(field.name)
+        if not fields and not flags:
+            return None
+
+        fields = fields or ["id"]
+        name = "_".join(["client", *fields, *flags])[:26]
+        return Index(
+            fields=fields, condition=Q(**flags) if flags else None,
+            name=f"{name.rstrip('_')}_idx",
+        )
+
+    def index_exists(self, index: Index, existing: dict) -> bool:
+        """
+        Check the database for an index that serves the proposed one.
+
+        Partial indexes are matched by name, the introspection doesn't
+        return their condition. Other indexes match any index or unique
+        constraint starting with the same columns.
+        """
+        if index.name in existing:
+            return True
+        if index.condition is not None:
+            return False
+        columns = [
+            Client._meta.get_field(name).column for name in index.fields
+        ]
+        return any(
+            (info["index"] or info["unique"])
+            and info["columns"][:len(columns)] == columns
+            for info in existing.values()
+        )
+
+    def seed(self, rows: int, database: str):
+        """
+        Insert clients shaped like production data.
+
+        70% are active with an invite code, half of those were invited by
+        one of the first 5%. The rest never verified their number.
+
+        :param rows: Number of clients.
+        :type rows: int
+        :param database: Database alias.
+        :type database: str
+        """
+        now = timezone.now()
+        clients = []
+        for index in range(rows):
+            active = index % 10 < 7
+            requested = now - timedelta(days=index % 30)
+            clients.append(Client(
+                phone_number=f"+7700{index:07d}",
+                is_active=active,
+                invite_code=f"_{index:05x}" if active else None,
+                created_at=requested,
+                last_otp_at=requested,
+            ))
+        manager = Client.objects.db_manager(database)
+        created = manager.bulk_create(clients, batch_size=1000)
+
+        active = [client for client in created if client.is_active]
+        inviters = active[:max(1, len(active) // 20)]
+        followers = active[len(inviters)::2]
+        for index, client in enumerate(followers):
+            client.invited_by = inviters[index % len(inviters)]
+        manager.bulk_update(followers, ("invited_by",), batch_size=1000)
+
+    def sample(self, database: str) -> dict:
+        """Pick lookup values that exist in the dataset."""
+        inviter = Client.objects.using(database).filter(
+            client__isnull=False
+        ).values("phone_number", "invite_code").first()
+        inviter = inviter or {
+            "phone_number": "+77000000000", "invite_code": "AAAAAA"
+        }
+        return {**inviter, "new_code": "zzzzzz"}
+
+    def explain(self, queryset, database: str) -> dict:
+        """
+        Run a query under EXPLAIN (ANALYZE, BUFFERS).
+
+        :return: The root of the JSON plan with the execution time.
+        :rtype: dict
+        """
+        plan = json.loads(queryset.using(database).explain(
+            format="json", analyze=True, buffers=True
+        ))[0]
+        return {**plan["Plan"], "Execution Time": plan["Execution Time"]}
+
+    def audit(self, options: dict) -> tuple:
+        database = options["database"]
+        table = Client._meta.db_table
+        if options["rows"]:
+            self.seed(rows=options["rows"], database=database)
+        with connections[database].cursor() as cursor:
+            cursor.execute(
+                f"ANALYZE {connections[database].ops.quote_name(table)}"
+            )
+            existing = connections[database].introspection.get_constraints(
+                cursor, table
+            )
+
+        self.stdout.write(
+            f"{'query':<60}{'cost':>10}{'ms':>9}{'buffers':>9}  findings"
+        )
+        flagged = 0
+        proposals = []
+        sample = self.sample(database=database)
+        for name, queryset, index in self.queries(sample):
+            plan = self.explain(queryset, database)
+            scans = [
+                node for node in walk(plan) if node["Node Type"] == "Seq Scan"
+            ]
+            findings = [
+                f"Seq Scan on {node['Relation Name']}" for node in scans
+            ]
+            if plan["Total Cost"] > options["cost_threshold"]:
+                findings.append(
+                    f"cost over {options['cost_threshold']:g}"
+                )
+            buffers = (
+                plan.get("Shared Hit Blocks", 0)
+                + plan.get("Shared Read Blocks", 0)
+            )
+            style = self.style.WARNING if findings else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{name:<60}{plan['Total Cost']:>10.1f}"
+                f"{plan['Execution Time']:>9.2f}{buffers:>9}  "
+                f"{', '.join(findings) or 'ok'}"
+            ))
+            if not findings:
+                continue
+            flagged += 1
+            # Queries without a known index get one from the scan filter
+            candidates = [index] if index is not None else [
+                self.derive_index(node) for node in scans
+                if node["Relation Name"] == table
+            ]
+            for proposal in candidates:
+                if proposal is None or self.index_exists(proposal, existing):
+                    continue
+                if all(proposal.name != other.name for _, other in proposals):
+                    proposals.append((name, proposal))
+        return flagged, proposals
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            raise CommandError("audit_queries needs PostgreSQL.")
+
+        try:
+            with transaction.atomic(using=options["database"]):
+                flagged, proposals = self.audit(options)
+                raise Rollback
+        except Rollback:
+            pass
+        except IntegrityError as e:
+            raise CommandError(
+                f"Seeding clashed with existing data ({e}), "
+                "run with --rows 0."
+            )
+
+        if proposals:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                "Missing indexes, add them to Client.Meta.indexes "
+                "and run makemigrations:"
+            ))
+            for name, index in proposals:
+                self.stdout.write(f"    # {name}")
+                self.stdout.write(
+                    f"    {MigrationWriter.serialize(index)[0]},"
+                )
+        elif not flagged:
+            self.stdout.write(self.style.SUCCESS("All queries use indexes."))
+
+        if flagged and options["fail_on_findings"]:
+            raise CommandError(f"{flagged} queries were flagged.")
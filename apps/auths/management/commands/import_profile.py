@@ -0,0 +1,75 @@
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Python
+import os
+import subprocess
+import sys
+
+
+STARTUP_CODE = "import django; django.setup(); import settings.urls"
+
+
+class Command(BaseCommand):
+    """Report which imports make worker startup slow."""
+
+    help = (
+        "Start Django in a fresh interpreter with -X importtime and "
+        "list the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=25,
+            help="Number of imports to show (default %(default)s).",
+        )
+        parser.add_argument(
+            "--no-warmup", action="store_true",
+            help="Profile without the app warmup in AuthsConfig.ready.",
+        )
+
+    def handle(self, *args, **options):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "settings.base"
+            ),
+        )
+        if options["no_warmup"]:
+            env["WARMUP_ON_READY"] = "False"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+            cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            self.stderr.write(result.stderr[-2000:])
+            return
+
+        imports = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            if not fields[0].strip().isdigit():
+                # The header line
+                continue
+            imports.append((
+                int(fields[0]), int(fields[1]), fields[2].rstrip()
+            ))
+
+        self.stdout.write(
+            f"{'self ms':>10}{'cumulative ms':>15}  module"
+        )
+        for self_us, cumulative_us, module in sorted(
+            imports, key=lambda item: item[1], reverse=True
+        )[:options["top"]]:
+            self.stdout.write(
+                f"{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}"
+                f"  {module}"
+            )
+        total = sum(self_us for self_us, _, _ in imports)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(imports)} modules imported in {total / 1000:.1f} ms."
+        ))
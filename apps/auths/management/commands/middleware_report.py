@@ -0,0 +1,134 @@
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.module_loading import import_string
+
+# Python
+from collections import defaultdict
+import time
+
+# Local
+from settings.middleware import JWTOnlyBypassMixin
+
+
+class Command(BaseCommand):
+    """Per-middleware timing report for the scoped middleware stack."""
+
+    help = (
+        "Measure the self time of every middleware in MIDDLEWARE "
+        "with and without the JWT-only bypass."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=2000,
+            help="Requests per path and stack (default 2000).",
+        )
+        parser.add_argument(
+            "--path", action="append", dest="paths",
+            help="Path to measure, can be repeated.",
+        )
+
+    def stock_class(self, middleware_class: type) -> type:
+        """
+        Return the original Django middleware for a scoped one.
+
+        :param middleware_class: Middleware class from MIDDLEWARE.
+        :type middleware_class: type
+        :return: The class without the JWT-only bypass.
+        :rtype: type
+        """
+        if not issubclass(middleware_class, JWTOnlyBypassMixin):
+            return middleware_class
+        return next(
+            base for base in middleware_class.__bases__
+            if base is not JWTOnlyBypassMixin
+        )
+
+    def measure(self, classes: list, path: str, iterations: int) -> dict:
+        """
+        Run requests through a middleware chain and collect self times.
+
+        :param classes: Middleware classes, outermost first.
+        :type classes: list
+        :param path: Request path.
+        :type path: str
+        :param iterations: Number of requests.
+        :type iterations: int
+        :return: Average self time in microseconds per middleware index.
+        :rtype: dict
+        """
+        inclusive = defaultdict(float)
+        instances = []
+
+        def view(request):
+            return HttpResponse()
+
+        def inner(request):
+            for instance in instances:
+                process_view = getattr(instance, "process_view", None)
+                if process_view is None:
+                    continue
+                response = process_view(request, view, (), {})
+                if response is not None:
+                    return response
+            start = time.perf_counter()
+            response = view(request)
+            inclusive[len(classes)] += time.perf_counter() - start
+            return response
+
+        def timed(index, instance):
+            def call(request):
+                start = time.perf_counter()
+                response = instance(request)
+                inclusive[index] += time.perf_counter() - start
+                return response
+            return call
+
+        handler = inner
+        for index in reversed(range(len(classes))):
+            instance = classes[index](handler)
+            instances.insert(0, instance)
+            handler = timed(index, instance)
+
+        factory = RequestFactory()
+        for _ in range(iterations):
+            handler(factory.get(path))
+
+        return {
+            index: (inclusive[index] - inclusive[index + 1])
+            / iterations * 1_000_000
+            for index in range(len(classes))
+        }
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        paths = options["paths"] or [
+            "/admin/", *settings.JWT_ONLY_PATH_PREFIXES
+        ]
+        scoped = [import_string(path) for path in settings.MIDDLEWARE]
+        stock = [self.stock_class(cls) for cls in scoped]
+
+        for path in paths:
+            before = self.measure(stock, path, iterations)
+            after = self.measure(scoped, path, iterations)
+            self.stdout.write(self.style.MIGRATE_HEADING(path))
+            self.stdout.write(
+                f"{'middleware':<45}{'stock us':>12}"
+                f"{'scoped us':>12}{'saved us':>12}"
+            )
+            for index, cls in enumerate(scoped):
+                self.stdout.write(
+                    f"{cls.__name__:<45}{before[index]:>12.2f}"
+                    f"{after[index]:>12.2f}"
+                    f"{before[index] - after[index]:>12.2f}"
+                )
+            total_before = sum(before.values())
+            total_after = sum(after.values())
+            self.stdout.write(self.style.SUCCESS(
+                f"{'total':<45}{total_before:>12.2f}"
+                f"{total_after:>12.2f}"
+                f"{total_before - total_after:>12.2f}"
+            ))
@@ -0,0 +1,98 @@
+# Django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Python
+import logging
+import time
+
+# Local
+from auths.models import Client
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Delete clients that requested a code but never verified it."""
+
+    help = (
+        "Delete stale inactive clients in throttled batches, "
+        "iterating over primary keys."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=float,
+            default=settings.UNVERIFIED_CLIENT_TTL_HOURS,
+            help="Hours since the last code request (default %(default)s).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Rows deleted per batch (default %(default)s).",
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=0.5,
+            help="Pause between batches in seconds (default %(default)s).",
+        )
+        parser.add_argument(
+            "--max-batches", type=int, default=None,
+            help="Stop after this many batches.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only count the rows that would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        stale = Client.objects.stale_unverified(
+            older_than=options["older_than"]
+        )
+        started = time.monotonic()
+        last_id = 0
+        batches = 0
+        removed = 0
+        cascaded = 0
+
+        while options["max_batches"] is None \
+                or batches < options["max_batches"]:
+            ids = list(
+                stale.filter(id__gt=last_id).order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            batches += 1
+            if options["dry_run"]:
+                removed += len(ids)
+                continue
+
+            # The conditions are checked again under a row lock, a client
+            # may have requested a new code since the ids were read
+            with transaction.atomic():
+                batch = list(
+                    stale.filter(id__in=ids).select_for_update()
+                    .values_list("id", flat=True)
+                )
+                total, _ = Client.objects.filter(id__in=batch).delete()
+            removed += len(batch)
+            cascaded += total - len(batch)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"batch {batches}: up to id {last_id}")
+            if len(ids) == batch_size:
+                time.sleep(options["sleep"])
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Unverified clients purge: removed=%s cascaded=%s batches=%s "
+            "elapsed=%.2fs dry_run=%s",
+            removed, cascaded, batches, elapsed, options["dry_run"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would remove' if options['dry_run'] else 'Removed'} "
+            f"{removed} clients in {batches} batches ({elapsed:.2f} s), "
+            f"{cascaded} related rows deleted with them."
+        ))
@@ -0,0 +1,23 @@
+# Django
+from django.core.management.base import BaseCommand
+
+# Local
+from auths import leaderboard
+
+
+class Command(BaseCommand):
+    """Repopulate the top-inviter leaderboard from PostgreSQL."""
+
+    help = "Rebuild the Redis leaderboard of inviters from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Rows per database fetch and Redis write (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        total = leaderboard.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Leaderboard rebuilt: {total} inviters."
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-19 15:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auths', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='дата создания'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_otp_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='последний запрос кода'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('auths', '0002_client_created_at_client_last_otp_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='client_inactive_id_idx'),
+        ),
+    ]
@@ -3,9 +3,11 @@ from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import (
     PermissionsMixin, AbstractBaseUser,
 )
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import Q
 from django.core.exceptions import ValidationError
 from django.core.cache import cache
+from django.utils import timezone
 
 # Third-Party
 from phonenumber_field.modelfields import PhoneNumberField
@@ -13,6 +15,7 @@ from phonenumber_field.phonenumber import PhoneNumber
 from phonenumber_field.validators import to_python
 
 # Python
+from datetime import timedelta
 import secrets
 import string
 import random
@@ -21,6 +24,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# pg_advisory_xact_lock key serializing changes of the referral tree
+REFERRAL_TREE_LOCK = 0x696E76697465
+
 
 class ClientManager(BaseUserManager):
     """Custom class for User Manager."""
@@ -57,7 +63,7 @@ class ClientManager(BaseUserManager):
             if not self.model.objects.filter(
                 invite_code=code
             ).exists():
-                logger.info(msg=f"CODE: {code}")
+                logger.info("CODE: %s", code)
                 return code
 
     def create_user(self, phone_number: str) -> "Client":
@@ -83,6 +89,83 @@ class ClientManager(BaseUserManager):
         user.save()
         return user
     
+    def assign_inviter(self, client_id: int, invite_code: str) -> int:
+        """
+        Link the client to the owner of the invite code in one statement.
+
+        The update only applies if the client has no inviter yet, the code
+        exists and the client is not the inviter or one of its ancestors
+        (self-invites and cycles in the referral tree).
+
+        Two clients inviting each other at once would both pass the
+        ancestors check, so the transaction first takes an advisory lock.
+        The UPDATE runs after the lock is granted and sees the tree
+        committed by the other one. The lock is global: every redemption,
+        rejected ones included, waits for the one in progress. It is held
+        for a single indexed update, which is far below the rate codes
+        are redeemed at.
+
+        :param client_id: The id of the client being invited.
+        :type client_id: int
+        :param invite_code: The invite code of the inviter.
+        :type invite_code: str
+        :return: The id of the assigned inviter or None.
+        :rtype: int
+        """
+        connection = connections[router.db_for_write(self.model)]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = f"""
+            WITH RECURSIVE ancestors AS (
+                SELECT id, invited_by_id FROM {table}
+                WHERE invite_code = %s
+                UNION
+                SELECT parent.id, parent.invited_by_id FROM {table} parent
+                JOIN ancestors ON parent.id = ancestors.invited_by_id
+            )
+            UPDATE {table} SET invited_by_id = (
+                SELECT id FROM {table} WHERE invite_code = %s
+            )
+            WHERE id = %s AND invited_by_id IS NULL
+                AND EXISTS (SELECT 1 FROM ancestors)
+                AND NOT EXISTS (
+                    SELECT 1 FROM ancestors WHERE ancestors.id = %s
+                )
+            RETURNING invited_by_id
+        """
+        # The lock is released when the transaction ends
+        with transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s)", [REFERRAL_TREE_LOCK]
+            )
+            cursor.execute(
+                sql, [invite_code, invite_code, client_id, client_id]
+            )
+            if cursor.rowcount != 1:
+                return None
+            return cursor.fetchone()[0]
+
+    def stale_unverified(self, older_than: float):
+        """
+        Get inactive clients whose last code request is older than the cutoff.
+
+        Only clients without an invite code qualify: the code is set on
+        activation, so a client deactivated later keeps it (and may have
+        followers that would be deleted with it).
+
+        :param older_than: Hours since the last code request.
+        :type older_than: float
+        :return: Queryset of stale clients.
+        :rtype: QuerySet
+        """
+        cutoff = timezone.now() - timedelta(hours=older_than)
+        return self.filter(
+            Q(last_otp_at__lt=cutoff)
+            | Q(last_otp_at__isnull=True, created_at__lt=cutoff),
+            is_active=False, is_staff=False, is_superuser=False,
+            invite_code__isnull=True,
+        )
+
     def create_superuser(
         self, phone_number: str, password: str
     ) -> "Client":
@@ -137,6 +220,12 @@ class Client(AbstractBaseUser, PermissionsMixin):
         to="Client", on_delete=models.CASCADE,
         null=True, blank=True
     )
+    created_at = models.DateTimeField(
+        verbose_name="дата создания", default=timezone.now
+    )
+    last_otp_at = models.DateTimeField(
+        verbose_name="последний запрос кода", null=True, blank=True
+    )
 
     USERNAME_FIELD = "phone_number"
     REQUIRED_FIELDS = []
@@ -147,6 +236,13 @@ class Client(AbstractBaseUser, PermissionsMixin):
         ordering = ("id",)
         verbose_name = "клиент"
         verbose_name_plural = "клиенты"
+        indexes = (
+            # Keyset iteration over never-verified clients (purge_unverified)
+            models.Index(
+                fields=("id",), condition=Q(is_active=False),
+                name="client_inactive_id_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.phone_number}"
@@ -76,3 +76,26 @@ class TokensSerializer(serializers.Serializer):
     access_token = serializers.CharField()
     refresh_token = serializers.CharField()
 
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """Serializer for leaderboard query parameters."""
+
+    limit = serializers.IntegerField(
+        min_value=1, max_value=100, default=10
+    )
+
+
+class LeaderboardEntrySerializer(serializers.Serializer):
+    """Serializer for a place in the leaderboard."""
+
+    rank = serializers.IntegerField(allow_null=True)
+    # Masked in the top, only the client's own number is shown in full
+    phone_number = serializers.CharField()
+    followers = serializers.IntegerField()
+
+
+class LeaderboardSerializer(serializers.Serializer):
+    """Serializer for top inviters and the current client's place."""
+
+    top = LeaderboardEntrySerializer(many=True)
+    me = LeaderboardEntrySerializer()
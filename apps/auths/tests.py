@@ -1,10 +1,55 @@
+# Simple JWT
+from rest_framework_simplejwt.tokens import AccessToken
+
 # Rest Framework
 from rest_framework.test import APIClient
 from rest_framework import status
 
 # Django
-from django.test import TestCase
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Index, Q
 from django.urls import reverse
+from django.utils import timezone
+
+# Third-Party
+from redis.exceptions import RedisError
+
+# Python
+from datetime import timedelta
+from io import StringIO
+import json
+import logging
+from unittest import mock
+import threading
+import unittest
+
+# Local
+from auths import leaderboard, warmup
+from auths.management.commands.audit_queries import (
+    Command as AuditQueriesCommand,
+)
+from auths.models import REFERRAL_TREE_LOCK, Client
+from settings import routers
+from settings.admission import ConcurrencyLimiter
+from settings.cache import LocalTier, TwoTierRedisCache
+from settings.log import (
+    JsonFormatter, QueueListenerHandler, RequestIdFilter, SamplingFilter,
+    request_id,
+)
+from settings.middleware import (
+    AdmissionControlMiddleware, PrimaryPinningMiddleware,
+    RequestIdMiddleware, ScopedAuthenticationMiddleware,
+    ScopedSessionMiddleware,
+)
 
 
 class TestCustomAuth(TestCase):
@@ -41,3 +86,654 @@ class TestCustomAuth(TestCase):
         self.assertIn("phone_number", response.data)
 
 
+class TestScopedMiddleware(SimpleTestCase):
+    def setUp(self) -> None:
+        self.factory = RequestFactory()
+        self.middleware = ScopedSessionMiddleware(
+            ScopedAuthenticationMiddleware(lambda request: HttpResponse())
+        )
+
+    def test_api_path_skips_session(self):
+        request = self.factory.get(reverse("personal-area"))
+        self.middleware(request)
+        self.assertFalse(hasattr(request, "session"))
+        self.assertFalse(hasattr(request, "user"))
+
+    def test_admin_path_keeps_session(self):
+        request = self.factory.get("/admin/")
+        self.middleware(request)
+        self.assertTrue(hasattr(request, "session"))
+        self.assertTrue(hasattr(request, "user"))
+
+
+class TestLocalTier(SimpleTestCase):
+    def setUp(self) -> None:
+        self.tier = LocalTier(max_entries=2, timeout=5)
+
+    def test_lru_eviction(self):
+        self.tier.set("a", 1)
+        self.tier.set("b", 2)
+        self.tier.get("a")
+        self.tier.set("c", 3)
+        self.assertEqual(self.tier.get("a"), (True, 1))
+        self.assertEqual(self.tier.get("b"), (False, None))
+        self.assertEqual(self.tier.get("c"), (True, 3))
+
+    def test_ttl_expiry(self):
+        with mock.patch("settings.cache.time.monotonic", return_value=0):
+            self.tier.set("a", 1, timeout=60)
+        with mock.patch("settings.cache.time.monotonic", return_value=6):
+            self.assertEqual(self.tier.get("a"), (False, None))
+        self.assertEqual((self.tier.hits, self.tier.misses), (0, 1))
+
+    def test_values_are_copies(self):
+        value = {"is_active": False}
+        self.tier.set("a", value)
+        value["is_active"] = True
+        self.assertEqual(self.tier.get("a"), (True, {"is_active": False}))
+
+
+class TestTwoTierRedisCache(SimpleTestCase):
+    """Two cache nodes sharing a fake Redis and invalidation channel."""
+
+    def setUp(self) -> None:
+        self.store = {}
+        self.nodes = [self.make_node(), self.make_node()]
+
+    def make_node(self) -> TwoTierRedisCache:
+        node = TwoTierRedisCache(
+            "redis://127.0.0.1:6379/1", {"OPTIONS": {"L1_TIMEOUT": 60}}
+        )
+        node._client = mock.Mock()
+        node._client.get.side_effect = (
+            lambda key, default, version, client:
+            self.store.get(key, default)
+        )
+        node._client.set.side_effect = (
+            lambda key, value, **kwargs: self.store.__setitem__(key, value)
+        )
+        redis = node._client.get_client.return_value
+        redis.publish.side_effect = self.publish
+        pipeline = redis.pipeline.return_value
+        pipeline.publish.side_effect = self.publish
+        pipeline.execute.return_value = [True, 1]
+        return node
+
+    def publish(self, channel: str, message: str):
+        for node in self.nodes:
+            node._on_invalidate({"data": message.encode()})
+
+    def test_write_invalidates_other_node(self):
+        first, second = self.nodes
+        first.set("key", 1)
+        self.assertEqual(second.get("key"), 1)
+        first.set("key", 2)
+        self.assertEqual(second.get("key"), 2)
+
+    def test_write_and_publish_in_one_round_trip(self):
+        node = self.nodes[0]
+        redis = node._client.get_client.return_value
+        self.assertTrue(node.set("key", 1))
+        node.delete("key")
+        pipeline = redis.pipeline.return_value
+        self.assertEqual(pipeline.execute.call_count, 2)
+        self.assertEqual(pipeline.publish.call_count, 2)
+        self.assertEqual(
+            node._client.set.call_args.kwargs["client"], pipeline
+        )
+        redis.publish.assert_not_called()
+
+    def test_stats(self):
+        node = self.nodes[0]
+        self.assertIsNone(node.get("key"))
+        self.store["key"] = 1
+        node.get("key")
+        node.get("key")
+        self.assertEqual(node.stats(), {
+            "l1": {"hits": 1, "misses": 2, "size": 1},
+            "l2": {"hits": 1, "misses": 1},
+        })
+
+    def test_listener_restarts_after_fork(self):
+        node = self.nodes[0]
+        pubsub = node._client.get_client.return_value.pubsub
+        self.store["key"] = 1
+        node.get("key")
+        self.assertEqual(pubsub.call_count, 1)
+
+        node._listener_pid = -1
+        node.get("key")
+        self.assertEqual(pubsub.call_count, 2)
+        self.assertEqual(node.stats()["l2"]["hits"], 2)
+
+    def test_listener_error_closes_pubsub(self):
+        node = self.nodes[0]
+        node.get("key")
+        pubsub, thread = mock.Mock(), mock.Mock()
+        node._on_listener_error(ConnectionError(), pubsub, thread)
+        thread.stop.assert_called_once_with()
+        pubsub.close.assert_called_once_with()
+        self.assertIsNone(node._listener_pid)
+
+
+class TestPersonalAreaInvite(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        patcher = mock.patch("auths.leaderboard.record_invite")
+        self.record_invite = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse("personal-area")
+        self.inviter = Client.objects.create(
+            phone_number="+77777777701", invite_code="AAAAAA",
+            is_active=True,
+        )
+        self.follower = Client.objects.create(
+            phone_number="+77777777702", invite_code="BBBBBB",
+            is_active=True,
+        )
+
+    def patch_invite(self, client: Client, code: str):
+        self.client.force_authenticate(user=client)
+        return self.client.patch(self.url, {"invited_by": code})
+
+    def test_assign_inviter(self):
+        response = self.patch_invite(self.follower, "AAAAAA")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.follower.refresh_from_db()
+        self.assertEqual(self.follower.invited_by, self.inviter)
+        self.record_invite.assert_called_once_with(
+            inviter_id=self.inviter.id
+        )
+
+    def test_assign_inviter_takes_tree_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            Client.objects.assign_inviter(
+                client_id=self.follower.id, invite_code="AAAAAA"
+            )
+        statements = [query["sql"] for query in queries]
+        lock = next(
+            index for index, sql in enumerate(statements)
+            if "pg_advisory_xact_lock" in sql
+        )
+        self.assertIn(str(REFERRAL_TREE_LOCK), statements[lock])
+        self.assertIn("UPDATE", statements[lock + 1])
+
+    def test_inviter_assigned_once(self):
+        self.patch_invite(self.follower, "AAAAAA")
+        other = Client.objects.create(
+            phone_number="+77777777703", invite_code="CCCCCC",
+            is_active=True,
+        )
+        response = self.patch_invite(self.follower, "CCCCCC")
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.follower.refresh_from_db()
+        self.assertEqual(self.follower.invited_by_id, self.inviter.id)
+        self.assertNotEqual(self.follower.invited_by_id, other.id)
+
+    def test_unknown_code(self):
+        response = self.patch_invite(self.follower, "ZZZZZZ")
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.follower.refresh_from_db()
+        self.assertIsNone(self.follower.invited_by)
+
+    def test_self_invite(self):
+        response = self.patch_invite(self.inviter, "AAAAAA")
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.inviter.refresh_from_db()
+        self.assertIsNone(self.inviter.invited_by)
+
+    def test_cycle(self):
+        self.patch_invite(self.follower, "AAAAAA")
+        response = self.patch_invite(self.inviter, "BBBBBB")
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.inviter.refresh_from_db()
+        self.assertIsNone(self.inviter.invited_by)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class TestPrimaryReplicaRouter(SimpleTestCase):
+    def setUp(self) -> None:
+        self.router = routers.PrimaryReplicaRouter()
+        self.token = routers.start_request()
+
+    def tearDown(self) -> None:
+        routers.end_request(self.token)
+
+    @mock.patch.object(routers, "replica_is_healthy", return_value=True)
+    def test_read_from_replica(self, _):
+        self.assertEqual(self.router.db_for_read(Client), "replica1")
+
+    @mock.patch.object(routers, "replica_is_healthy", return_value=False)
+    def test_unhealthy_replica_skipped(self, _):
+        self.assertEqual(self.router.db_for_read(Client), "default")
+
+    @mock.patch.object(routers, "replica_is_healthy", return_value=True)
+    def test_read_your_writes(self, _):
+        self.assertEqual(self.router.db_for_write(Client), "default")
+        self.assertEqual(self.router.db_for_read(Client), "default")
+        token = routers.start_request()
+        self.assertEqual(self.router.db_for_read(Client), "replica1")
+        routers.end_request(token)
+
+    def test_pin_cookie_set_only_on_write(self):
+        def view(request):
+            if request.method == "POST":
+                self.router.db_for_write(Client)
+            pinned.append(routers.is_pinned())
+            return HttpResponse()
+
+        pinned = []
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post("/"))
+        self.assertIn("db_pin", response.cookies)
+
+        request = factory.get("/")
+        request.COOKIES["db_pin"] = "1"
+        response = middleware(request)
+        self.assertNotIn("db_pin", response.cookies)
+        self.assertEqual(pinned, [True, True])
+
+    def test_pin_by_token_without_cookie(self):
+        def view(request):
+            if request.method == "POST":
+                self.router.db_for_write(Client)
+            pinned.append(routers.is_pinned())
+            return HttpResponse()
+
+        def authorized(method: str, client_id: int):
+            token = AccessToken.for_user(Client(id=client_id))
+            return getattr(factory, method)(
+                "/", HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+
+        pinned = []
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        self.addCleanup(cache.delete_many, ["db_pin:901", "db_pin:902"])
+
+        middleware(authorized("post", 901))
+        middleware(authorized("get", 901))
+        middleware(authorized("get", 902))
+        middleware(factory.get("/", HTTP_AUTHORIZATION="Bearer broken"))
+        self.assertEqual(pinned, [True, True, False, False])
+
+    @mock.patch.object(routers, "replica_lag", return_value=60.0)
+    def test_lagging_replica_unhealthy(self, _):
+        routers._health.clear()
+        self.assertFalse(routers.replica_is_healthy("replica1"))
+
+
+# A mirror of the test database standing in for a read replica, unless
+# DB_REPLICA_HOSTS already configured one
+if "replica1" not in connections:
+    default = connections.settings["default"]
+    connections.settings["replica1"] = {
+        **default, "TEST": {**default["TEST"], "MIRROR": "default"},
+    }
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class TestReplicaRouting(TransactionTestCase):
+    """Route real queries to the replica1 mirror."""
+
+    databases = {"default", "replica1"}
+
+    def setUp(self) -> None:
+        routers._health.clear()
+        patcher = mock.patch.object(
+            routers, "replica_lag", return_value=0.0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_and_writes(self):
+        token = routers.start_request()
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica1"]) as replica:
+            client = Client.objects.create(phone_number="+77777777750")
+            Client.objects.get(id=client.id)
+        routers.end_request(token)
+        self.assertEqual(len(primary), 2)
+        self.assertEqual(len(replica), 0)
+
+        token = routers.start_request()
+        with CaptureQueriesContext(connections["default"]) as primary, \
+                CaptureQueriesContext(connections["replica1"]) as replica:
+            self.assertEqual(
+                Client.objects.get(id=client.id).phone_number,
+                "+77777777750",
+            )
+        routers.end_request(token)
+        self.assertEqual(len(primary), 0)
+        self.assertEqual(len(replica), 1)
+
+
+class TestLeaderboard(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.inviter = Client.objects.create(
+            phone_number="+77777777701", invite_code="AAAAAA",
+            is_active=True,
+        )
+        self.client.force_authenticate(user=self.inviter)
+
+    @mock.patch("auths.leaderboard.rank", return_value=(1, 3))
+    @mock.patch("auths.leaderboard.top")
+    def test_get_leaderboard(self, top, _):
+        top.return_value = [(self.inviter.id, 3)]
+        response = self.client.get(reverse("leaderboard"), {"limit": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        top.assert_called_once_with(limit=5)
+        self.assertEqual(response.data["top"][0]["followers"], 3)
+        self.assertEqual(
+            response.data["top"][0]["phone_number"], "+7********01"
+        )
+        self.assertEqual(response.data["me"]["phone_number"], "+77777777701")
+        self.assertEqual(response.data["me"]["rank"], 1)
+
+    def test_limit_validation(self):
+        response = self.client.get(reverse("leaderboard"), {"limit": 0})
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+    @mock.patch("auths.leaderboard.top", side_effect=RedisError)
+    def test_redis_unavailable(self, _):
+        response = self.client.get(reverse("leaderboard"))
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    @mock.patch("auths.leaderboard.get_redis_connection")
+    def test_rebuild_reads_primary(self, get_redis_connection):
+        follower = Client.objects.create(
+            phone_number="+77777777702", invited_by=self.inviter,
+        )
+        redis = get_redis_connection.return_value
+        pipeline = redis.pipeline.return_value
+        pipeline.__len__.return_value = 0
+        with mock.patch.object(
+            routers.PrimaryReplicaRouter, "db_for_read",
+            return_value="replica1",
+        ):
+            self.assertEqual(leaderboard.rebuild(), 1)
+        pipeline.set.assert_called_once_with(
+            leaderboard.REBUILD_MARKER_KEY, 1, ex=leaderboard.REBUILD_TIMEOUT
+        )
+        pipeline.zincrby.assert_called_once_with(
+            leaderboard.REBUILD_KEY, 1, follower.invited_by_id
+        )
+        redis.register_script.assert_called_once_with(
+            leaderboard.FINISH_REBUILD_SCRIPT
+        )
+
+
+class TestPurgeUnverified(TestCase):
+    def setUp(self) -> None:
+        old = timezone.now() - timedelta(days=2)
+        self.stale = [
+            Client.objects.create(
+                phone_number=f"+7777777771{i}", last_otp_at=old
+            )
+            for i in range(3)
+        ]
+        self.recent = Client.objects.create(
+            phone_number="+77777777720", last_otp_at=timezone.now()
+        )
+        self.active = Client.objects.create(
+            phone_number="+77777777721", last_otp_at=old, is_active=True
+        )
+
+    def test_purge(self):
+        call_command(
+            "purge_unverified", batch_size=2, sleep=0, stdout=StringIO()
+        )
+        self.assertFalse(Client.objects.filter(
+            id__in=[client.id for client in self.stale]
+        ).exists())
+        self.assertTrue(Client.objects.filter(id=self.recent.id).exists())
+        self.assertTrue(Client.objects.filter(id=self.active.id).exists())
+
+    @mock.patch("auths.views.time.sleep")
+    def test_code_requested_during_purge(self, _):
+        stale = self.stale[0]
+        get_or_create = Client.objects.get_or_create
+
+        def purged_meanwhile(**kwargs):
+            if not Client.objects.filter(pk=stale.pk).exists():
+                return get_or_create(**kwargs)
+            Client.objects.filter(pk=stale.pk).delete()
+            return stale, False
+
+        with mock.patch.object(
+            Client.objects, "get_or_create", side_effect=purged_meanwhile
+        ), mock.patch.object(
+            Client.objects, "generate_otp", return_value="123456"
+        ):
+            response = APIClient().post(
+                reverse("custom-auth"),
+                {"phone_number": str(stale.phone_number)},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        client = cache.get("123456_client")
+        self.addCleanup(cache.delete, "123456_client")
+        self.assertNotEqual(client.pk, stale.pk)
+        self.assertTrue(Client.objects.filter(pk=client.pk).exists())
+
+    def test_deactivated_inviter_kept(self):
+        old = timezone.now() - timedelta(days=2)
+        inviter = Client.objects.create(
+            phone_number="+77777777730", invite_code="AAAAAA",
+            last_otp_at=old, is_active=False,
+        )
+        follower = Client.objects.create(
+            phone_number="+77777777731", invite_code="BBBBBB",
+            invited_by=inviter, is_active=True,
+        )
+        out = StringIO()
+        call_command("purge_unverified", sleep=0, stdout=out)
+        self.assertTrue(Client.objects.filter(id=inviter.id).exists())
+        self.assertTrue(Client.objects.filter(id=follower.id).exists())
+        self.assertIn("Removed 3 clients", out.getvalue())
+        self.assertIn("0 related rows", out.getvalue())
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command("purge_unverified", dry_run=True, stdout=out)
+        self.assertIn("Would remove 3 clients", out.getvalue())
+        self.assertEqual(Client.objects.count(), 5)
+
+
+class TestStructuredLogging(SimpleTestCase):
+    def make_record(self, level: int) -> logging.LogRecord:
+        return logging.LogRecord(
+            name="auths", level=level, pathname=__file__, lineno=1,
+            msg="CODE: %s", args=("AbC123",), exc_info=None,
+        )
+
+    def test_json_format(self):
+        record = self.make_record(logging.INFO)
+        record.request_id = "req-1"
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data["message"], "CODE: AbC123")
+        self.assertEqual(data["request_id"], "req-1")
+
+    def test_sampling_keeps_warnings(self):
+        sampling = SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(self.make_record(logging.INFO)))
+        self.assertTrue(sampling.filter(self.make_record(logging.WARNING)))
+
+    def test_request_id_middleware(self):
+        seen = []
+        middleware = RequestIdMiddleware(
+            lambda request: seen.append(request_id.get()) or HttpResponse()
+        )
+        request = RequestFactory().get("/", HTTP_X_REQUEST_ID="req-2")
+        response = middleware(request)
+        self.assertEqual(seen, ["req-2"])
+        self.assertEqual(response["X-Request-ID"], "req-2")
+        self.assertEqual(request_id.get(), "-")
+
+    def test_django_logs_through_queue(self):
+        for name in ("django", "django.request", "django.server"):
+            self.assertEqual(logging.getLogger(name).handlers, [])
+        self.assertIsInstance(
+            logging.getLogger().handlers[0], QueueListenerHandler
+        )
+
+    def test_request_id_after_response(self):
+        # django.request logs 4xx/5xx once the middleware has returned
+        request = RequestFactory().get("/", HTTP_X_REQUEST_ID="req-3")
+        RequestIdMiddleware(lambda request: HttpResponse(status=400))(
+            request
+        )
+        record = self.make_record(logging.WARNING)
+        record.request = request
+        RequestIdFilter().filter(record)
+        self.assertEqual(record.request_id, "req-3")
+
+
+class TestProbes(SimpleTestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def test_healthz(self):
+        response = self.client.get(reverse("healthz"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @mock.patch.dict(warmup._state, {"preloaded": True, "connected": False})
+    @mock.patch.object(
+        warmup, "prime_connections", side_effect=ConnectionError
+    )
+    def test_not_ready_until_connected(self, _):
+        response = self.client.get(reverse("readyz"))
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    @mock.patch.dict(warmup._state, {"preloaded": True, "connected": True})
+    def test_ready(self):
+        response = self.client.get(reverse("readyz"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TestAdmissionControl(SimpleTestCase):
+    def test_reject_when_queue_full(self):
+        limiter = ConcurrencyLimiter(limit=1, queue=0)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+
+    def test_wait_times_out(self):
+        limiter = ConcurrencyLimiter(limit=1, queue=1, timeout=0.01)
+        limiter.acquire()
+        self.assertFalse(limiter.acquire())
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_waiter_gets_released_slot(self):
+        limiter = ConcurrencyLimiter(limit=1, queue=1, timeout=5)
+        limiter.acquire()
+        timer = threading.Timer(0.05, limiter.release, args=(0.05,))
+        timer.start()
+        self.assertTrue(limiter.acquire())
+        timer.join()
+
+    def test_adaptive_limit(self):
+        limiter = ConcurrencyLimiter(
+            limit=10, adaptive=True, target_latency=0.1
+        )
+        limiter.acquire()
+        limiter.release(latency=1.0)
+        self.assertEqual(limiter.limit, 9)
+        limiter.latency = 0.0
+        limiter.acquire()
+        limiter.release(latency=0.0)
+        self.assertEqual(limiter.limit, 10)
+
+    @override_settings(ADMISSION_CONTROL_ADAPTIVE=True)
+    def test_adaptive_lowers_default_limits(self):
+        middleware = AdmissionControlMiddleware(
+            lambda request: HttpResponse()
+        )
+        for prefix, limiter in middleware.limiters.items():
+            with self.subTest(prefix=prefix):
+                self.assertTrue(limiter.acquire())
+                limiter.release(latency=limiter.target_latency * 2)
+                self.assertLess(
+                    limiter.limit,
+                    settings.ADMISSION_CONTROL[prefix]["limit"],
+                )
+                self.assertGreater(
+                    settings.ADMISSION_CONTROL[prefix]["queue"], 0
+                )
+
+    @override_settings(ADMISSION_CONTROL={
+        "/api/v1/auths/": {"limit": 1, "queue": 0},
+    })
+    def test_middleware_sheds_load(self):
+        middleware = AdmissionControlMiddleware(
+            lambda request: HttpResponse()
+        )
+        middleware.limiters["/api/v1/auths/"].acquire()
+        request = RequestFactory().get(reverse("custom-auth"))
+        response = middleware(request)
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(response["Retry-After"], "1")
+        other = middleware(RequestFactory().get(reverse("healthz")))
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL's"
+)
+class TestAuditQueries(TestCase):
+    def test_audit_rolls_back_seed(self):
+        out = StringIO()
+        call_command("audit_queries", rows=500, stdout=out)
+        self.assertIn("stale unverified clients", out.getvalue())
+        self.assertEqual(Client.objects.count(), 0)
+
+
+class TestAuditIndexProposals(SimpleTestCase):
+    def setUp(self) -> None:
+        self.command = AuditQueriesCommand()
+
+    def test_derive_index_from_filter(self):
+        index = self.command.derive_index({
+            "Node Type": "Seq Scan", "Relation Name": "auths_client",
+            "Filter": "((NOT is_active) AND (last_otp_at < now()))",
+        })
+        self.assertEqual(index.fields, ["last_otp_at"])
+        self.assertEqual(index.condition, Q(is_active=False))
+        self.assertLessEqual(len(index.name), 30)
+
+    def test_derive_index_without_columns(self):
+        self.assertIsNone(self.command.derive_index(
+            {"Node Type": "Seq Scan", "Relation Name": "auths_client"}
+        ))
+
+    def test_index_exists(self):
+        existing = {
+            "auths_client_invite_code_key": {
+                "columns": ["invite_code"], "index": False, "unique": True,
+            },
+        }
+        self.assertTrue(self.command.index_exists(
+            Index(fields=("invite_code",), name="client_invite_code_idx"),
+            existing,
+        ))
+        self.assertFalse(self.command.index_exists(
+            Index(fields=("last_otp_at",), name="client_last_otp_at_idx"),
+            existing,
+        ))
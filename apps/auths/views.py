@@ -13,9 +13,11 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 
 # Django
 from django.core.cache import cache
+from django.utils import timezone
 
 # Third-Party
 from drf_spectacular.utils import extend_schema
+from redis.exceptions import RedisError
 
 # Python
 import logging
@@ -25,9 +27,11 @@ import time
 from .serializers import (
     PhoneNumberSerializer, OTPSerializer, ClientSerializer,
     InviteSerializer, SomeResponseSerializer,
-    TokensSerializer,
+    TokensSerializer, LeaderboardQuerySerializer, LeaderboardSerializer,
 )
 from .models import Client
+from . import leaderboard, warmup
+from settings.routers import pin_client
 
 
 logger = logging.getLogger(__name__)
@@ -58,8 +62,7 @@ class CustomAuth(APIView):
                     "refresh_token":str(refresh_token)
                 }
             except TokenError as e:
-                logger.warning(msg=e)
-                pass
+                logger.warning("Token error: %s", e)
     
     @extend_schema(
         description="Pass.",
@@ -99,9 +102,19 @@ class CustomAuth(APIView):
         serializer = PhoneNumberSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         phone_number = serializer.validated_data.get("phone_number")
-        client, _ = Client.objects.get_or_create(
-            phone_number=phone_number
+        now = timezone.now()
+        client, created = Client.objects.get_or_create(
+            phone_number=phone_number, defaults={"last_otp_at": now}
         )
+        if not created and not client.is_active:
+            updated = Client.objects.filter(pk=client.pk).update(
+                last_otp_at=now
+            )
+            if not updated:
+                # purge_unverified deleted the client in the meantime
+                client, _ = Client.objects.get_or_create(
+                    phone_number=phone_number, defaults={"last_otp_at": now}
+                )
         otp = Client.objects.generate_otp()
         time.sleep(2.0)
         cache.set(key=f"{otp}_client", value=client, timeout=120)
@@ -136,6 +149,9 @@ class CustomAuth(APIView):
                 client.invite_code = Client.objects.generate_invite_code()
                 client.is_active = True
                 client.save(update_fields=("is_active", "invite_code"))
+                # The next request authenticates with the new token,
+                # a lagging replica may still see the client inactive
+                pin_client(client.id)
             
             pairs = self.create_tokens(client=client)
             cache.delete(key=f"{otp}_client")
@@ -143,7 +159,7 @@ class CustomAuth(APIView):
             response.is_valid(raise_exception=True)
             return Response(status=status.HTTP_200_OK, data=response.data)
         
-        logger.info(msg="User not found!")
+        logger.info("User not found!")
         response = SomeResponseSerializer(data={
             "response": "Пользователь не найден, возможно вы ждали дольше 2 минут. Вернитесь на предыдущий шаг."
         })
@@ -199,33 +215,150 @@ class PersonalArea(APIView):
         serializer = InviteSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         invited_by = serializer.validated_data.get("invited_by")
-        try:
-            inviter = Client.objects.get(invite_code=invited_by)
-            if client.invited_by:
-                response = SomeResponseSerializer(data={
-                    "response":"ERROR: you already have inviter!"
-                })
-                response.is_valid(raise_exception=True)
-                return Response(
-                    data=response.data, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            elif not client.invited_by:
-                client.invited_by = inviter
-                client.save(update_fields=("invited_by",))
-                response = SomeResponseSerializer(data={
-                    "response":"Inviter added!"
-                })
-                response.is_valid(raise_exception=True)
-                return Response(
-                    status=status.HTTP_200_OK, data=response.data
-                )
-        except Client.DoesNotExist:
+        inviter_id = Client.objects.assign_inviter(
+            client_id=client.id, invite_code=invited_by
+        )
+        if inviter_id is not None:
+            try:
+                leaderboard.record_invite(inviter_id=inviter_id)
+            except RedisError as e:
+                logger.warning("Leaderboard not updated: %s", e)
             response = SomeResponseSerializer(data={
-                "response":f"ERROR: the client with code: {invited_by} not found."
+                "response":"Inviter added!"
             })
             response.is_valid(raise_exception=True)
             return Response(
-                status=status.HTTP_400_BAD_REQUEST, data=response.data
+                status=status.HTTP_200_OK, data=response.data
             )
 
+        # The update was rejected, find out why for the error message
+        if not Client.objects.filter(invite_code=invited_by).exists():
+            message = f"ERROR: the client with code: {invited_by} not found."
+        elif Client.objects.filter(
+            id=client.id, invited_by__isnull=False
+        ).exists():
+            message = "ERROR: you already have inviter!"
+        else:
+            message = "ERROR: you can't be invited by yourself or your followers!"
+        response = SomeResponseSerializer(data={"response":message})
+        response.is_valid(raise_exception=True)
+        return Response(
+            status=status.HTTP_400_BAD_REQUEST, data=response.data
+        )
+
+
+@permission_classes([IsAuthenticated])
+class Leaderboard(APIView):
+    """
+    View for the top inviters.
+    This view returns the clients with the most followers and the place of the current client.
+    Phone numbers of other clients are masked.
+    """
+
+    authentication_classes = [JWTAuthentication]
+
+    @extend_schema(
+        parameters=[LeaderboardQuerySerializer],
+        responses={
+            200: LeaderboardSerializer,
+            503: SomeResponseSerializer,
+        },
+    )
+    def get(self, request: Request) -> Response:
+        """
+        Handle GET requests to retrieve the leaderboard.
+
+        :param request: The request object.
+        :type request: Request
+        :return: Response with top inviters and the client's rank,
+            503 if Redis is unavailable.
+        :rtype: Response
+        """
+        client: Client = request.user
+        serializer = LeaderboardQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        try:
+            top = leaderboard.top(
+                limit=serializer.validated_data.get("limit")
+            )
+            my_rank, my_followers = leaderboard.rank(client_id=client.id)
+        except RedisError as e:
+            logger.warning("Leaderboard unavailable: %s", e)
+            return Response(
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                data={"response": "Leaderboard is unavailable."},
+            )
+
+        phone_numbers = dict(Client.objects.filter(
+            id__in=[client_id for client_id, _ in top]
+        ).values_list("id", "phone_number"))
+        data = {
+            "top": [
+                {
+                    "rank": position,
+                    "phone_number": leaderboard.mask_phone_number(
+                        phone_numbers[client_id]
+                    ),
+                    "followers": followers,
+                }
+                for position, (client_id, followers) in enumerate(top, 1)
+                if client_id in phone_numbers
+            ],
+            "me": {
+                "rank": my_rank,
+                "phone_number": str(client.phone_number),
+                "followers": my_followers,
+            },
+        }
+        return Response(
+            status=status.HTTP_200_OK,
+            data=LeaderboardSerializer(instance=data).data,
+        )
+
+
+@permission_classes([AllowAny])
+class Healthz(APIView):
+    """
+    Liveness probe.
+    The process answers requests, nothing else is checked.
+    """
+
+    authentication_classes = []
+
+    @extend_schema(exclude=True)
+    def get(self, request: Request) -> Response:
+        return Response(status=status.HTTP_200_OK, data={"response": "ok"})
+
+
+@permission_classes([AllowAny])
+class Readyz(APIView):
+    """
+    Readiness probe.
+    The worker is ready once the warmup preloaded the app and opened its database and Redis connections.
+    """
+
+    authentication_classes = []
+
+    @extend_schema(exclude=True)
+    def get(self, request: Request) -> Response:
+        """
+        Handle GET requests to check readiness.
+
+        :param request: The request object.
+        :type request: Request
+        :return: 200 if the worker is warmed up, 503 otherwise.
+        :rtype: Response
+        """
+        if not warmup.is_ready():
+            try:
+                warmup.prime_connections()
+            except Exception as e:
+                logger.warning("Not ready: %s", e)
+        if warmup.is_ready():
+            return Response(
+                status=status.HTTP_200_OK, data={"response": "ready"}
+            )
+        return Response(
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            data={"response": "warming up"},
+        )
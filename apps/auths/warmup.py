@@ -0,0 +1,60 @@
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import get_resolver
+
+# Third-Party
+import phonenumbers
+from phonenumbers import PhoneMetadata
+
+# Python
+import logging
+import time
+
+# Local
+from settings.routers import replica_is_healthy
+
+
+logger = logging.getLogger(__name__)
+
+_state = {"preloaded": False, "connected": False}
+
+
+def preload():
+    """
+    Do the lazy work of the first requests at startup.
+
+    Loads the phone number metadata of every region and imports the URL
+    configuration with the views, serializers and DRF. Nothing here opens
+    a socket, so it is safe to run in the gunicorn master before forking.
+    """
+    started = time.perf_counter()
+    for region in phonenumbers.SUPPORTED_REGIONS:
+        PhoneMetadata.metadata_for_region(region)
+    for country_code in phonenumbers.COUNTRY_CODES_FOR_NON_GEO_REGIONS:
+        PhoneMetadata.metadata_for_nongeo_region(country_code)
+    phonenumbers.parse("+77777777777")
+    get_resolver().url_patterns
+    _state["preloaded"] = True
+    logger.debug("Preload done in %.3f s", time.perf_counter() - started)
+
+
+def prime_connections():
+    """
+    Open the database and Redis connections of the current process.
+
+    Must run after the fork, connections can't be shared by workers.
+    Replicas are optional, reads fall back to the primary.
+
+    :raises Exception: If the primary database or Redis is not reachable.
+    """
+    connections[DEFAULT_DB_ALIAS].ensure_connection()
+    for alias in settings.DATABASE_REPLICAS:
+        replica_is_healthy(alias)
+    cache.get("warmup")
+    _state["connected"] = True
+
+
+def is_ready() -> bool:
+    return all(_state.values())
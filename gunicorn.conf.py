@@ -0,0 +1,71 @@
+# Python
+from concurrent.futures import wait
+import multiprocessing
+import os
+import threading
+
+
+bind = "0.0.0.0:8000"
+# Threaded workers, settings.ADMISSION_CONTROL limits each of them
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# With CONN_MAX_AGE every thread keeps its own connection to each database
+# server, so workers * threads must fit in the connections the app may
+# use (max_connections=100 minus the reserve for migrations, the
+# retention job and admin sessions)
+db_connection_budget = int(os.environ.get("DB_CONNECTION_BUDGET", 80))
+workers = int(os.environ.get(
+    "GUNICORN_WORKERS",
+    max(1, min(
+        multiprocessing.cpu_count() * 2 + 1, db_connection_budget // threads
+    )),
+))
+
+# Import Django and run the app warmup once in the master, workers share
+# the loaded modules copy-on-write
+preload_app = True
+
+
+def on_starting(server):
+    if workers * threads > db_connection_budget:
+        server.log.warning(
+            "%s workers x %s threads exceed DB_CONNECTION_BUDGET=%s",
+            workers, threads, db_connection_budget,
+        )
+
+
+def post_worker_init(worker):
+    """
+    Open the database and Redis connections of the worker.
+
+    Django connections are per thread, so in a threaded worker every
+    thread of the request pool primes its own. The barrier keeps each
+    task on a separate thread.
+    """
+    from auths import warmup
+
+    pool = getattr(worker, "tpool", None)
+    if pool is None:
+        prime(worker, warmup)
+        return
+
+    barrier = threading.Barrier(worker.cfg.threads, timeout=5)
+
+    def task():
+        barrier.wait()
+        prime(worker, warmup)
+
+    futures = [pool.submit(task) for _ in range(worker.cfg.threads)]
+    wait(futures)
+    for future in futures:
+        if future.exception() is not None:
+            worker.log.warning(
+                "Worker %s not warmed up: %s", worker.pid, future.exception()
+            )
+            break
+
+
+def prime(worker, warmup):
+    try:
+        warmup.prime_connections()
+    except Exception as e:
+        worker.log.warning("Worker %s not warmed up: %s", worker.pid, e)
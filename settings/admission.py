@@ -0,0 +1,96 @@
+# Python
+import threading
+import time
+
+
+class ConcurrencyLimiter:
+    """
+    Cap the number of requests a route handles at once.
+
+    Requests over the limit wait in a bounded queue for at most
+    ``timeout`` seconds, when the queue is full they are rejected right
+    away. In adaptive mode the limit shrinks while the average latency is
+    above ``target_latency`` and grows back once it recovers.
+    """
+
+    # Weight of the newest sample in the latency average
+    SMOOTHING = 0.2
+    # Share of the limit kept on every decrease
+    BACKOFF = 0.9
+
+    def __init__(
+        self, limit: int, queue: int = 0, timeout: float = 1.0,
+        adaptive: bool = False, target_latency: float = 1.0,
+        min_limit: int = 1,
+    ):
+        self.max_limit = limit
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.active = 0
+        self.waiting = 0
+        self.latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> bool:
+        """
+        Take a slot, waiting in the queue if needed.
+
+        :return: False if the request must be rejected.
+        :rtype: bool
+        """
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency: float):
+        """
+        Free a slot.
+
+        :param latency: Seconds the request took.
+        :type latency: float
+        """
+        with self._condition:
+            self.active -= 1
+            if self.adaptive:
+                self._adapt(latency)
+            self._condition.notify()
+
+    def _adapt(self, latency: float):
+        """Multiplicative decrease, additive increase of the limit."""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.SMOOTHING * (latency - self.latency)
+
+        now = time.monotonic()
+        if self.latency > self.target_latency:
+            # Give the previous decrease time to take effect
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(
+                    self.min_limit, int(self.limit * self.BACKOFF)
+                )
+                self._last_decrease = now
+        elif self.limit < self.max_limit:
+            self.limit += 1
+            self._condition.notify()
@@ -1,5 +1,5 @@
 # Third-Party
-from decouple import config
+from decouple import config, Csv
 import django_redis
 
 # Python
@@ -47,16 +47,61 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "settings.middleware.RequestIdMiddleware",
+    "settings.middleware.AdmissionControlMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "settings.middleware.PrimaryPinningMiddleware",
+    "settings.middleware.ScopedSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
+    "settings.middleware.ScopedCsrfViewMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
+    "settings.middleware.ScopedAuthenticationMiddleware",
+    "settings.middleware.ScopedMessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Routes authenticated only by JWT (or not at all),
+# session/csrf/messages are skipped
+JWT_ONLY_PATH_PREFIXES = (
+    "/api/v1/auths/",
+    "/api/v1/personal-area/",
+    "/api/v1/leaderboard/",
+    "/healthz/",
+    "/readyz/",
+)
+
+# Concurrent requests per route in each worker, see
+# settings.admission.ConcurrencyLimiter. Waiting requests hold a gunicorn
+# thread, limit + queue of all routes stays under GUNICORN_THREADS (8) so
+# the probes and the leaderboard always find a free thread. gunicorn
+# doesn't balance by load, each route gets a queue for the bursts of a
+# single worker and a limit above 1 for the adaptive mode to lower.
+#
+# Database connections: with CONN_MAX_AGE every gunicorn thread keeps its
+# own connection to the primary and to each replica, whatever route it
+# serves, so a host opens GUNICORN_WORKERS * GUNICORN_THREADS connections
+# per database server. gunicorn.conf.py sizes the workers to keep that
+# within DB_CONNECTION_BUDGET (80 of max_connections=100 by default, the
+# rest is left for migrations, purge_unverified and admin sessions).
+# E.g. 8 CPUs: min(2 * 8 + 1, 80 // 8) = 10 workers * 8 threads = 80.
+ADMISSION_CONTROL = {
+    # POST waits 2 seconds for the "sms"
+    "/api/v1/auths/": {
+        "limit": 2, "queue": 2, "timeout": 2.0, "target_latency": 3.0,
+    },
+    "/api/v1/personal-area/": {
+        "limit": 2, "queue": 1, "timeout": 0.5, "target_latency": 0.5,
+    },
+}
+# Lower the limits while latency is above target_latency
+ADMISSION_CONTROL_ADAPTIVE = config(
+    "ADMISSION_CONTROL_ADAPTIVE", default=False, cast=bool
+)
+ADMISSION_RETRY_AFTER = 1
+
+# Load phone metadata and the URLconf when the app starts
+WARMUP_ON_READY = config("WARMUP_ON_READY", default=True, cast=bool)
+
 ROOT_URLCONF = "settings.urls"
 
 TEMPLATES = [
@@ -89,9 +134,44 @@ DATABASES = {
         "PASSWORD": config("DB_PASS"),
         "HOST": config("DB_HOST"),
         "PORT": config("DB_PORT"),
+        # Keep connections open between requests, one per gunicorn
+        # thread, see ADMISSION_CONTROL and auths.warmup
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=60, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS = "10.0.0.2:5432,10.0.0.3:5432"
+# Tests use them as mirrors of the default test database.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    config("DB_REPLICA_HOSTS", default="", cast=Csv()), start=1
+):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        # The health check runs inside requests, fail fast on a dead host
+        "OPTIONS": {
+            "connect_timeout": config(
+                "DB_REPLICA_CONNECT_TIMEOUT", default=2, cast=int
+            ),
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
+
+DATABASE_ROUTERS = ["settings.routers.PrimaryReplicaRouter"]
+# Replicas lagging more than this (seconds) are skipped
+DB_REPLICA_MAX_LAG = config("DB_REPLICA_MAX_LAG", default=5, cast=float)
+DB_REPLICA_CHECK_INTERVAL = config(
+    "DB_REPLICA_CHECK_INTERVAL", default=10, cast=float
+)
+# Clients that wrote read from the primary for this many seconds
+DB_PIN_COOKIE = "db_pin"
+DB_PIN_SECONDS = config("DB_PIN_SECONDS", default=10, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -111,25 +191,44 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Inactive clients that did not request a code for this many hours
+# are deleted by "manage.py purge_unverified"
+UNVERIFIED_CLIENT_TTL_HOURS = config(
+    "UNVERIFIED_CLIENT_TTL_HOURS", default=24, cast=float
+)
+
 # Django cors headers
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_METHODS = ["*"]
 CORS_ALLOW_HEADERS = ["*"]
 
 # Logger
+# Records are queued in the request thread and written as JSON lines by
+# a background thread. LOG_INFO_SAMPLE_RATE < 1 keeps only that share of
+# INFO records, warnings and errors are always written.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {
+            "()": "settings.log.RequestIdFilter",
+        },
+        "sampling": {
+            "()": "settings.log.SamplingFilter",
+            "rate": config("LOG_INFO_SAMPLE_RATE", default=1.0, cast=float),
+        },
+    },
     "handlers": {
         "console": {
-            "class": "logging.StreamHandler",
+            "()": "settings.log.QueueListenerHandler",
             "level": "INFO",
-            "formatter": "detailed",
+            "formatter": "json",
+            "filters": ["request_id", "sampling"],
         },
     },
     "formatters": {
-        "detailed": {
-            "format": "%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        "json": {
+            "()": "settings.log.JsonFormatter",
             "datefmt": "%Y-%m-%d %H:%M:%S",
         },
     },
@@ -137,6 +236,12 @@ LOGGING = {
         "handlers": ["console"],
         "level": "INFO",
     },
+    # Drop Django's default handlers (plain text console, admin emails),
+    # its records go through the root queue handler like the rest
+    "loggers": {
+        "django": {"handlers": [], "level": "INFO", "propagate": True},
+        "django.server": {"handlers": [], "propagate": True},
+    },
 } # Logging config
 
 dictConfig(LOGGING)
@@ -145,14 +250,37 @@ logger = logging.getLogger(__name__)
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "settings.cache.TwoTierRedisCache",
         "LOCATION": REDIS_URL,
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # In-process tier in front of Redis
+            "L1_MAX_ENTRIES": config(
+                "CACHE_L1_MAX_ENTRIES", default=1024, cast=int
+            ),
+            "L1_TIMEOUT": config("CACHE_L1_TIMEOUT", default=5, cast=float),
+            "INVALIDATION_CHANNEL": "cache:invalidate",
         }
     }
 }
 
+# Redis Sentinel, e.g. REDIS_SENTINELS = "10.0.0.1:26379,10.0.0.2:26379"
+REDIS_SENTINELS = config("REDIS_SENTINELS", default="", cast=Csv())
+if REDIS_SENTINELS:
+    REDIS_SENTINEL_SERVICE = config(
+        "REDIS_SENTINEL_SERVICE", default="mymaster"
+    )
+    CACHES["default"]["LOCATION"] = f"redis://{REDIS_SENTINEL_SERVICE}/0"
+    CACHES["default"]["OPTIONS"].update({
+        "CLIENT_CLASS": "django_redis.client.SentinelClient",
+        "CONNECTION_FACTORY": "django_redis.pool.SentinelConnectionFactory",
+        "SENTINELS": [
+            (host, int(port)) for host, port in (
+                sentinel.rsplit(":", 1) for sentinel in REDIS_SENTINELS
+            )
+        ],
+    })
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
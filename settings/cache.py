@@ -0,0 +1,380 @@
+# Django
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+# Third-Party
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+# Python
+from collections import OrderedDict
+import logging
+import os
+import pickle
+import threading
+import time
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+CLEAR_ALL = "*"
+
+
+class LocalTier:
+    """Bounded in-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries: int, timeout: float):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> tuple:
+        """
+        Look up a key.
+
+        :param key: Full cache key.
+        :type key: str
+        :return: Pair of (found, value).
+        :rtype: tuple
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return True, pickle.loads(entry[1])
+
+    def set(self, key: str, value, timeout: float = None):
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        :param key: Full cache key.
+        :type key: str
+        :param value: Any picklable value.
+        :param timeout: Seconds to keep the entry, capped by the tier timeout.
+        :type timeout: float
+        """
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        if timeout <= 0:
+            return
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    django_redis backend with an in-process LRU tier in front of Redis.
+
+    Reads are served from the local tier when possible. Every write
+    publishes the key on a Redis channel and every worker drops it from
+    its local tier, the local timeout bounds staleness if a message is
+    lost. The write and the publish are sent in one pipeline.
+    """
+
+    def __init__(self, server: str, params: dict) -> None:
+        super().__init__(server, params)
+        options = params.get("OPTIONS", {})
+        self._local = LocalTier(
+            max_entries=int(options.get("L1_MAX_ENTRIES", 1024)),
+            timeout=float(options.get("L1_TIMEOUT", 5)),
+        )
+        self._channel = options.get(
+            "INVALIDATION_CHANNEL", "cache:invalidate"
+        )
+        self._node_id = uuid.uuid4().hex
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+        self._l2_hits = 0
+        self._l2_misses = 0
+
+    def _on_invalidate(self, message: dict):
+        node_id, _, key = message["data"].decode().partition(":")
+        if node_id == self._node_id:
+            return
+        if key == CLEAR_ALL:
+            self._local.clear()
+        else:
+            self._local.delete(key)
+
+    def _on_listener_error(self, error, pubsub, thread):
+        logger.warning("Cache invalidation listener stopped: %s", error)
+        thread.stop()
+        # The next call opens a new pubsub, release this one's connection
+        pubsub.close()
+        self._listener_pid = None
+        self._local.clear()
+
+    def _local_enabled(self) -> bool:
+        """
+        Start the invalidation listener in this process if needed.
+
+        Threads do not survive a fork, so the listener is bound to the
+        pid that started it.
+
+        :return: False if the local tier can't be trusted right now.
+        :rtype: bool
+        """
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return True
+        with self._listener_lock:
+            if self._listener_pid == pid:
+                return True
+            self._local.clear()
+            try:
+                pubsub = self.client.get_client(write=True).pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(**{self._channel: self._on_invalidate})
+                self._listener = pubsub.run_in_thread(
+                    sleep_time=1.0, daemon=True,
+                    exception_handler=self._on_listener_error,
+                )
+            except RedisError as e:
+                logger.warning("Local cache tier disabled: %s", e)
+                return False
+            self._listener_pid = pid
+        return True
+
+    def _invalidate(self, *keys, version=None, client=None):
+        """Drop keys from the local tier here and in other workers."""
+        if client is None:
+            client = self.client.get_client(write=True)
+        for key in keys:
+            if key == CLEAR_ALL:
+                full_key = CLEAR_ALL
+                self._local.clear()
+            else:
+                full_key = self.make_key(key, version=version)
+                self._local.delete(full_key)
+            client.publish(self._channel, f"{self._node_id}:{full_key}")
+
+    def _pipeline(self):
+        return self.client.get_client(write=True).pipeline(transaction=False)
+
+    def _execute(self, pipeline, *keys, version=None) -> list:
+        """
+        Publish the invalidation of the keys written to the pipeline and
+        send it, one round trip for the write and the publish.
+
+        :return: Replies of the queued commands, the write's first.
+        :rtype: list
+        """
+        self._invalidate(*keys, version=version, client=pipeline)
+        try:
+            return pipeline.execute()
+        except RedisError as e:
+            raise ConnectionInterrupted(connection=pipeline) from e
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counters per tier for this process.
+
+        :return: Counters of the local (l1) and Redis (l2) tiers.
+        :rtype: dict
+        """
+        return {
+            "l1": {
+                "hits": self._local.hits,
+                "misses": self._local.misses,
+                "size": len(self._local),
+            },
+            "l2": {"hits": self._l2_hits, "misses": self._l2_misses},
+        }
+
+    def get(self, key, default=None, version=None, client=None):
+        use_local = self._local_enabled()
+        full_key = self.make_key(key, version=version)
+        if use_local:
+            found, value = self._local.get(full_key)
+            if found:
+                return value
+
+        missing = object()
+        value = super().get(key, missing, version, client)
+        if value is missing:
+            self._l2_misses += 1
+            return default
+        self._l2_hits += 1
+        if use_local:
+            self._local.set(full_key, value)
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        result = {}
+        missing = []
+        use_local = self._local_enabled()
+        for key in keys:
+            found, value = (
+                self._local.get(self.make_key(key, version=version))
+                if use_local else (False, None)
+            )
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        if not missing:
+            return result
+
+        fetched = super().get_many(missing, version=version, client=client)
+        self._l2_hits += len(fetched)
+        self._l2_misses += len(missing) - len(fetched)
+        for key, value in fetched.items():
+            if use_local:
+                self._local.set(self.make_key(key, version=version), value)
+            result[key] = value
+        return result
+
+    def set(
+        self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+        client=None, nx=False, xx=False,
+    ):
+        # django_redis answers nx with a non-positive timeout by reading
+        # the key, which can't be queued
+        expired = (
+            timeout is not DEFAULT_TIMEOUT and timeout is not None
+            and timeout <= 0
+        )
+        if client is not None or (nx and expired):
+            result = super().set(
+                key, value, timeout=timeout, version=version,
+                client=client, nx=nx, xx=xx,
+            )
+            self._invalidate(key, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().set(
+            key, value, timeout=timeout, version=version,
+            client=pipeline, nx=nx, xx=xx,
+        )
+        return bool(self._execute(pipeline, key, version=version)[0])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self.set(
+            key, value, timeout=timeout, version=version, client=client,
+            nx=True,
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        if client is not None or not data:
+            result = super().set_many(
+                data, timeout=timeout, version=version, client=client
+            )
+            self._invalidate(*data, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        for key, value in data.items():
+            self.client.set(
+                key, value, timeout, version=version, client=pipeline
+            )
+        self._execute(pipeline, *data, version=version)
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        if client is not None:
+            result = super().delete(
+                key, version=version, prefix=prefix, client=client
+            )
+            self._invalidate(key, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().delete(key, version=version, prefix=prefix, client=pipeline)
+        return self._execute(pipeline, key, version=version)[0]
+
+    def delete_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        if client is not None or not keys:
+            result = super().delete_many(keys, version=version, client=client)
+            self._invalidate(*keys, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().delete_many(keys, version=version, client=pipeline)
+        return self._execute(pipeline, *keys, version=version)[0]
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self._invalidate(CLEAR_ALL)
+        return result
+
+    def clear(self):
+        result = super().clear()
+        self._invalidate(CLEAR_ALL)
+        return result
+
+    # incr and decr need the new value, the publish follows separately
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        result = super().incr(
+            key, delta=delta, version=version, client=client,
+            ignore_key_check=ignore_key_check,
+        )
+        self._invalidate(key, version=version)
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None):
+        result = super().decr(
+            key, delta=delta, version=version, client=client
+        )
+        self._invalidate(key, version=version)
+        return result
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        if client is not None:
+            result = super().touch(
+                key, timeout=timeout, version=version, client=client
+            )
+            self._invalidate(key, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().touch(key, timeout=timeout, version=version, client=pipeline)
+        return bool(self._execute(pipeline, key, version=version)[0])
+
+    def expire(self, key, timeout, version=None, client=None):
+        if client is not None:
+            result = super().expire(
+                key, timeout, version=version, client=client
+            )
+            self._invalidate(key, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().expire(key, timeout, version=version, client=pipeline)
+        return self._execute(pipeline, key, version=version)[0]
+
+    def persist(self, key, version=None, client=None):
+        if client is not None:
+            result = super().persist(key, version=version, client=client)
+            self._invalidate(key, version=version)
+            return result
+
+        pipeline = self._pipeline()
+        super().persist(key, version=version, client=pipeline)
+        return self._execute(pipeline, key, version=version)[0]
@@ -0,0 +1,118 @@
+# Python
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+
+
+# Id of the request being handled, set by RequestIdMiddleware
+request_id = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Attach the current request id to every record.
+
+    django.request logs the response after the middleware has returned,
+    those records carry the request with the id stored on it.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        value = request_id.get()
+        if value == "-":
+            value = getattr(
+                getattr(record, "request", None), "request_id", value
+            )
+        record.request_id = value
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of INFO and DEBUG records, warnings always pass."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queue records in the calling thread, format and write them in a
+    background thread.
+
+    The listener starts on the first record of each process, so it also
+    works in workers forked after the logging config was loaded.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self._target = logging.StreamHandler()
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            # The queue of the parent process can't be reused after a fork
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._target.setFormatter(self.formatter)
+            self._listener = QueueListener(self.queue, self._target)
+            self._listener.start()
+            self._listener_pid = pid
+            atexit.register(self._stop)
+
+    def _stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._listener_pid = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop the record rather than block the request
+            pass
+
+    def emit(self, record: logging.LogRecord):
+        self._start()
+        super().emit(record)
+
+    def close(self):
+        self._stop()
+        super().close()
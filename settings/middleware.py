@@ -0,0 +1,187 @@
+# Django
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+
+# Simple JWT
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+# Python
+import time
+import uuid
+
+# Local
+from . import routers
+from .admission import ConcurrencyLimiter
+from .log import request_id
+
+
+def is_jwt_only_path(path: str) -> bool:
+    """
+    Check whether the path belongs to a JWT-only API route.
+
+    :param path: The request path (``request.path_info``).
+    :type path: str
+    :return: True if session-based middleware can be skipped.
+    :rtype: bool
+    """
+    return path.startswith(tuple(settings.JWT_ONLY_PATH_PREFIXES))
+
+
+class JWTOnlyBypassMixin:
+    """
+    Skip the wrapped middleware for JWT-only API routes.
+
+    The API pipeline goes straight to the next layer, the admin and
+    every other route keep the original behaviour.
+    """
+
+    def __call__(self, request):
+        if is_jwt_only_path(request.path_info):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class ScopedSessionMiddleware(JWTOnlyBypassMixin, SessionMiddleware):
+    """Session middleware that is not applied to JWT-only routes."""
+
+
+class ScopedCsrfViewMiddleware(JWTOnlyBypassMixin, CsrfViewMiddleware):
+    """CSRF middleware that is not applied to JWT-only routes."""
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_jwt_only_path(request.path_info):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs
+        )
+
+
+class ScopedAuthenticationMiddleware(
+    JWTOnlyBypassMixin, AuthenticationMiddleware
+):
+    """Session auth middleware that is not applied to JWT-only routes."""
+
+
+class ScopedMessageMiddleware(JWTOnlyBypassMixin, MessageMiddleware):
+    """Messages middleware that is not applied to JWT-only routes."""
+
+
+class RequestIdMiddleware:
+    """
+    Tag log records with the id of the request.
+
+    The id is taken from the X-Request-ID header set by the proxy or
+    generated, and returned in the response. It is also kept on the
+    request for records logged after the middleware returns.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        value = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        request.request_id = value[:64]
+        token = request_id.set(request.request_id)
+        try:
+            response = self.get_response(request)
+            response["X-Request-ID"] = request_id.get()
+            return response
+        finally:
+            request_id.reset(token)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Scope the primary database pin to a single request.
+
+    A request that wrote to the primary pins the next requests of the
+    same client for DB_PIN_SECONDS, so they read their own writes too:
+    by a short-lived cookie and, for API clients without cookies, by the
+    client id of the access token. Requests pinned without writing don't
+    renew the pin.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        client_id = self.token_client_id(request)
+        token = routers.start_request(pinned=(
+            settings.DB_PIN_COOKIE in request.COOKIES
+            or (client_id is not None and routers.is_client_pinned(client_id))
+        ))
+        try:
+            response = self.get_response(request)
+            if routers.has_written() and settings.DATABASE_REPLICAS:
+                response.set_cookie(
+                    settings.DB_PIN_COOKIE, "1",
+                    max_age=settings.DB_PIN_SECONDS, httponly=True,
+                )
+                if client_id is not None:
+                    routers.pin_client(client_id)
+            return response
+        finally:
+            routers.end_request(token)
+
+    def token_client_id(self, request):
+        """
+        Get the client id from a valid Bearer access token.
+
+        :return: The client id or None.
+        """
+        scheme, _, raw = request.headers.get("Authorization", "").partition(
+            " "
+        )
+        if scheme not in api_settings.AUTH_HEADER_TYPES or not raw.strip():
+            return None
+        try:
+            return AccessToken(raw.strip()).get(api_settings.USER_ID_CLAIM)
+        except TokenError:
+            return None
+
+
+class AdmissionControlMiddleware:
+    """
+    Limit concurrent requests per route and shed the excess.
+
+    Limits are per worker process and configured by path prefix in
+    ADMISSION_CONTROL. A request that can't get a slot in time gets a
+    503 with Retry-After instead of piling up behind slow requests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiters = {
+            prefix: ConcurrencyLimiter(
+                adaptive=settings.ADMISSION_CONTROL_ADAPTIVE, **options
+            )
+            for prefix, options in settings.ADMISSION_CONTROL.items()
+        }
+
+    def __call__(self, request):
+        limiter = next((
+            limiter for prefix, limiter in self.limiters.items()
+            if request.path_info.startswith(prefix)
+        ), None)
+        if limiter is None:
+            return self.get_response(request)
+
+        if not limiter.acquire():
+            response = JsonResponse(
+                {"response": "Service is overloaded, try again later."},
+                status=503,
+            )
+            response["Retry-After"] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release(latency=time.monotonic() - started)
@@ -0,0 +1,171 @@
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Third-Party
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+# Python
+from contextvars import ContextVar
+import logging
+import random
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Set once the current request (or command) wrote to the primary, or
+# when the request arrived with the pin cookie
+_pinned = ContextVar("pinned_to_primary", default=False)
+# Set only by a write of the current request
+_wrote = ContextVar("wrote_to_primary", default=False)
+
+# alias -> (checked_at, healthy), shared by all threads of the process
+_health = {}
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def pin_to_primary():
+    """Send every following read of this context to the primary."""
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+def has_written() -> bool:
+    """Check whether this context wrote, a pin cookie alone doesn't count."""
+    return _wrote.get()
+
+
+def pin_client(client_id: int):
+    """
+    Pin the client's next requests to the primary for DB_PIN_SECONDS.
+
+    API clients don't keep cookies, the pin is stored in the cache under
+    the client id and looked up by the id in the access token.
+
+    :param client_id: The id of the client that wrote.
+    :type client_id: int
+    """
+    if not settings.DATABASE_REPLICAS:
+        return
+    try:
+        cache.set(
+            f"{settings.DB_PIN_COOKIE}:{client_id}", 1,
+            timeout=settings.DB_PIN_SECONDS,
+        )
+    except (ConnectionInterrupted, RedisError) as e:
+        logger.warning("Client %s not pinned: %s", client_id, e)
+
+
+def is_client_pinned(client_id: int) -> bool:
+    if not settings.DATABASE_REPLICAS:
+        return False
+    try:
+        return bool(cache.get(f"{settings.DB_PIN_COOKIE}:{client_id}"))
+    except (ConnectionInterrupted, RedisError) as e:
+        logger.warning("Pin of client %s unknown: %s", client_id, e)
+        return False
+
+
+def start_request(pinned: bool = False):
+    """
+    Reset the pin at the beginning of a request.
+
+    :param pinned: Start pinned, e.g. the client wrote a moment ago.
+    :type pinned: bool
+    :return: Token for :func:`end_request`.
+    """
+    return _pinned.set(pinned), _wrote.set(False)
+
+
+def end_request(token):
+    pinned, wrote = token
+    _pinned.reset(pinned)
+    _wrote.reset(wrote)
+
+
+def replica_lag(alias: str) -> float:
+    """
+    Replication lag of a replica in seconds.
+
+    :param alias: Database alias of the replica.
+    :type alias: str
+    :raises DatabaseError: If the replica can't be queried.
+    :return: Lag in seconds, 0 if the replica replayed everything.
+    :rtype: float
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+    return float(lag or 0)
+
+
+def replica_is_healthy(alias: str) -> bool:
+    """
+    Check that a replica answers and is not lagging behind.
+
+    Results are cached for DB_REPLICA_CHECK_INTERVAL seconds.
+
+    :param alias: Database alias of the replica.
+    :type alias: str
+    :return: True if reads can be sent to the replica.
+    :rtype: bool
+    """
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked and now - checked[0] < settings.DB_REPLICA_CHECK_INTERVAL:
+        return checked[1]
+
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.DB_REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning("Replica %s lags by %.1f s", alias, lag)
+    except DatabaseError as e:
+        logger.warning("Replica %s is unavailable: %s", alias, e)
+        healthy = False
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to healthy replicas and writes to the primary.
+
+    After the first write the context is pinned to the primary, so the
+    rest of the request reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if replica_is_healthy(alias)
+        ]
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -11,7 +11,9 @@ from django.contrib import admin
 from django.urls import path, include
 
 # Local
-from auths.views import CustomAuth, PersonalArea
+from auths.views import (
+    CustomAuth, PersonalArea, Leaderboard, Healthz, Readyz,
+)
 
 
 router = DefaultRouter(trailing_slash=True)
@@ -24,8 +26,12 @@ urlpatterns = [
     path("api/v1/auths/", CustomAuth.as_view(), name="custom-auth"),
     path("api/v1/personal-area/", PersonalArea.as_view(), 
         name="personal-area"),
+    path("api/v1/leaderboard/", Leaderboard.as_view(), 
+        name="leaderboard"),
     path("api/token/refresh/", TokenRefreshView.as_view(), 
         name="token_refresh"),
+    path("healthz/", Healthz.as_view(), name="healthz"),
+    path("readyz/", Readyz.as_view(), name="readyz"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/schema/swagger-ui/", SpectacularSwaggerView.as_view(
         url_name="schema"